@@ -1,11 +1,18 @@
 """
 API routes and endpoints
 """
+import asyncio
+import json
 import os
-import tempfile
 import traceback
+from typing import List
+
+import aiofiles
+import aiofiles.tempfile
+from cachetools import LRUCache
 from fastapi import APIRouter, UploadFile, File, HTTPException
-from langchain_core.messages import HumanMessage
+from fastapi.responses import StreamingResponse
+from langchain_core.messages import AIMessage, HumanMessage
 
 from app.api.v1.schemas import (
     QueryRequest,
@@ -18,61 +25,192 @@ from app.core.graph import get_agent_graph
 from app.core.prompts import get_system_message
 from app.services.vector_store import get_vector_store_service
 from app.services.ingestion import get_ingestion_service
-from app.db.session import get_db_connection
+from app.core.state import MAX_MESSAGE_WINDOW
+from app.db.session import get_db_pool, record_query
 
 router = APIRouter()
 
+# Full-answer cache: repeated questions within a session skip the agent run
+_answer_cache = LRUCache(maxsize=256)
+
+# Server-side conversation history keyed by session_id; the frontend
+# only ever sends the new user message
+_session_histories = LRUCache(maxsize=512)
+
+
+def _answer_cache_key(session_id: str, query: str) -> str:
+    """Cache key from session and whitespace/case-normalized query"""
+    return f"{session_id}|{' '.join(query.lower().split())}"
+
+
+def _session_history(session_id: str) -> list:
+    """Get (or start) the message history for a session"""
+    history = _session_histories.get(session_id)
+    if history is None:
+        history = []
+        _session_histories[session_id] = history
+    return history
+
+
+def _record_turn(session_id: str, query: str, answer: str) -> None:
+    """Append a user/assistant turn, keeping the history window bounded"""
+    history = _session_history(session_id)
+    history.append(HumanMessage(query))
+    history.append(AIMessage(answer))
+    if len(history) > MAX_MESSAGE_WINDOW:
+        del history[:len(history) - MAX_MESSAGE_WINDOW]
+
+
 @router.post("/agent/query", response_model=QueryResponse)
 async def query_agent(request: QueryRequest):
     """Query the intelligent RAG agent"""
-    
+
     try:
+        cache_key = _answer_cache_key(request.session_id, request.query)
+        cached = _answer_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         agent_graph = get_agent_graph()
         
-        # Prepare initial state
+        # Prepare initial state with the stored conversation so far
         initial_state = {
             "messages" : [
                 get_system_message(),
+                *_session_history(request.session_id),
                 HumanMessage(request.query)
             ],
             "tool_calls_made": 0,
-            "sources_used" : []
+            "sources_used" : [],
+            "tool_used": set()
         }
-        
+
         # Run the Agent
         result = await agent_graph.ainvoke(initial_state)
-        
+
         # Extract answer and metadata
         messages = result['messages']
         final_answer = messages[-1].content
-        
-        # Track which tools were used
-        tool_used = []
+
+        # Tool usage is tracked incrementally in state by the tools node
+        tool_used = sorted(result.get("tool_used") or [])
         sources = []
-        
-        for msg in messages:
-            if hasattr(msg, 'tool_calls') and msg.tool_calls:
-                for tool_call in msg.tool_calls:
-                    tool_name = tool_call.get("name", "unknown")
-                    if tool_name not in tool_used:
-                        tool_used.append(tool_name)
-                        
-        return QueryResponse(
+
+
+        response = QueryResponse(
             query = request.query,
             answer= final_answer,
             tool_used= tool_used,
             sources= sources,
             reasoning_steps= len(messages) // 2
         )
-        
+        _answer_cache[cache_key] = response
+        _record_turn(request.session_id, request.query, final_answer)
+
+        # Buffered write; a background task batches these into Postgres
+        record_query(request.session_id, request.query, final_answer, tool_used)
+
+        return response
+
     except Exception as e:
         raise HTTPException(status_code=500, detail= str(e))
-    
-    
-@router.post("/documents/upload", response_model=DocumentUploadResponse)
-async def upload_document(file: UploadFile = File(...)):
-    """Upload and process document"""
-    
+
+
+@router.post("/agent/query/stream")
+async def query_agent_stream(request: QueryRequest):
+    """Query the agent and stream the answer as Server-Sent Events
+
+    Emits token events as the LLM generates and a trailing summary event
+    with the same fields as QueryResponse."""
+
+    agent_graph = get_agent_graph()
+
+    initial_state = {
+        "messages" : [
+            get_system_message(),
+            *_session_history(request.session_id),
+            HumanMessage(request.query)
+        ],
+        "tool_calls_made": 0,
+        "sources_used" : [],
+        "tool_used": set()
+    }
+
+    async def event_gen():
+        answer_parts = []
+        tool_used = []
+        reasoning_steps = 0
+
+        try:
+            async for event in agent_graph.astream_events(initial_state, version="v2"):
+                kind = event["event"]
+
+                if kind == "on_chat_model_stream":
+                    chunk = event["data"]["chunk"]
+                    if chunk.content:
+                        answer_parts.append(chunk.content)
+                        yield "data: " + json.dumps(
+                            {"type": "token", "content": chunk.content}
+                        ) + "\n\n"
+
+                elif kind == "on_chat_model_end":
+                    reasoning_steps += 1
+
+                elif kind == "on_tool_start":
+                    tool_name = event.get("name", "unknown")
+                    if tool_name not in tool_used:
+                        tool_used.append(tool_name)
+
+            answer = "".join(answer_parts)
+            _record_turn(request.session_id, request.query, answer)
+
+            # Streamed queries feed analytics too, via the same
+            # buffered writer as the non-streaming endpoint
+            record_query(request.session_id, request.query, answer, tool_used)
+
+            # Populate the answer cache as well, so a repeat of a
+            # streamed question hits the cache on /agent/query
+            cache_key = _answer_cache_key(request.session_id, request.query)
+            _answer_cache[cache_key] = QueryResponse(
+                query=request.query,
+                answer=answer,
+                tool_used=tool_used,
+                sources=[],
+                reasoning_steps=reasoning_steps
+            )
+
+            summary = {
+                "type": "summary",
+                "query": request.query,
+                "answer": answer,
+                "tool_used": tool_used,
+                "sources": [],
+                "reasoning_steps": reasoning_steps
+            }
+            yield "data: " + json.dumps(summary) + "\n\n"
+
+        except Exception as e:
+            yield "data: " + json.dumps({"type": "error", "detail": str(e)}) + "\n\n"
+
+    # Explicit identity encoding makes GZipMiddleware pass this response
+    # through untouched; compressing SSE would buffer token events
+    return StreamingResponse(
+        event_gen(),
+        media_type="text/event-stream",
+        headers={"Content-Encoding": "identity"}
+    )
+
+
+@router.delete("/agent/session/{session_id}")
+async def delete_session(session_id: str):
+    """Drop the stored conversation history for a session"""
+    _session_histories.pop(session_id, None)
+    return {"status": "deleted", "session_id": session_id}
+
+
+async def _ingest_upload(file: UploadFile) -> DocumentUploadResponse:
+    """Validate, stage, and ingest one uploaded PDF"""
+
     # Validate file type
     if not file.filename.endswith('.pdf'):
         raise HTTPException(
@@ -98,30 +236,38 @@ async def upload_document(file: UploadFile = File(...)):
         )
     
     tmp_path = None
-    
+
     try:
-        # Read file content
-        content = await file.read()
-        
-        # Check file size (10MB limit)
+        # Stream the upload to a temp file in 1 MiB chunks so large PDFs
+        # never sit fully in memory and writes don't block the event loop
         MAX_SIZE = 10 * 1024 * 1024
-        if len(content) > MAX_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail="File too large (max 10MB)"
-            )
-            
-        # Create temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", mode='wb') as tmp:
-            tmp.write(content)
-            tmp_path = tmp.name
-            
+        CHUNK_SIZE = 1024 * 1024
+        total_size = 0
+
+        async with aiofiles.tempfile.NamedTemporaryFile(
+            'wb', delete=False, suffix=".pdf"
+        ) as tmp:
+            tmp_path = str(tmp.name)
+            while chunk := await file.read(CHUNK_SIZE):
+                total_size += len(chunk)
+                if total_size > MAX_SIZE:
+                    raise HTTPException(
+                        status_code=400,
+                        detail="File too large (max 10MB)"
+                    )
+                await tmp.write(chunk)
+
         # Process the PDF
         result = await ingestion_service.process_pdf(tmp_path, file.filename)
         
         # Store in vector database
         await vector_service.add_documents(result["chunks"])
-        
+
+        # New content invalidates cached answers and search results,
+        # mirroring the frontend's cache clear after upload
+        _answer_cache.clear()
+        vector_service.clear_search_cache()
+
         return DocumentUploadResponse(
             doc_id = result["doc_id"],
             filename= file.filename,
@@ -129,6 +275,9 @@ async def upload_document(file: UploadFile = File(...)):
             status= "success"
         )
         
+    except HTTPException:
+        raise
+
     except Exception as e:
         # Log full error for debugging
         print(f"Upload error: {str(e)}")
@@ -146,47 +295,80 @@ async def upload_document(file: UploadFile = File(...)):
                 os.unlink(tmp_path)
             except Exception as cleanup_error:
                 print(f"Failed to cleanup temp file: {cleanup_error}")
-                
-    
+
+
+@router.post("/documents/upload", response_model=DocumentUploadResponse)
+async def upload_document(file: UploadFile = File(...)):
+    """Upload and process document"""
+    return await _ingest_upload(file)
+
+
+@router.post("/documents/upload_batch", response_model=List[DocumentUploadResponse])
+async def upload_documents_batch(files: List[UploadFile] = File(...)):
+    """Upload and process several documents in one request
+
+    Files are ingested concurrently; a failing file is reported in its
+    own entry instead of failing the whole batch."""
+
+    results = await asyncio.gather(
+        *(_ingest_upload(f) for f in files),
+        return_exceptions=True
+    )
+
+    responses = []
+    for file, result in zip(files, results):
+        if isinstance(result, HTTPException):
+            responses.append(DocumentUploadResponse(
+                doc_id="",
+                filename=file.filename,
+                chunks_created=0,
+                status=f"error: {result.detail}"
+            ))
+        elif isinstance(result, Exception):
+            responses.append(DocumentUploadResponse(
+                doc_id="",
+                filename=file.filename,
+                chunks_created=0,
+                status=f"error: {result}"
+            ))
+        else:
+            responses.append(result)
+
+    return responses
+
+
 
 @router.get("/agent/analytics", response_model=AnalyticsResponse)
 async def get_analytics():
     """Get agent usage analytics"""
     
-    conn = await get_db_connection()
-    
+    pool = await get_db_pool()
+
     try:
-        # Total queries
-        total_queries = await conn.fetchval(
-            "SELECT COUNT(*) FROM agent_queries"
-        )
-        
-        # Average tools per query
-        avg_tools_per_query = await conn.fetchval(
-            "SELECT AVG(tool_used) FROM agent_queries"
-        )
-        
-        # Tool usage breakdown
-        tool_usage_rows  = await conn.fetch( # List of rows
-            """SELECT tool_name, COUNT(*) as usage_count
-                FROM agent_tool_usage
-                GROUP BY tool_name
-                ORDER BY usage_count DESC"""
-        )
-        
+        async with pool.acquire() as conn:
+            # Single round-trip: totals, average and tool breakdown together
+            row = await conn.fetchrow(
+                """SELECT
+                    (SELECT COUNT(*) FROM agent_queries) AS total_queries,
+                    (SELECT AVG(tools_used) FROM agent_queries) AS avg_tools_per_query,
+                    COALESCE(json_agg(t ORDER BY t.usage_count DESC), '[]') AS tool_usage
+                FROM (
+                    SELECT tool_name, usage_count
+                    FROM agent_tool_usage_rollup
+                ) t"""
+            )
+
         tool_usage = [
-            ToolUsage(tool=row['tool_name'], count= row['usage_count'])
-            for row in tool_usage_rows
+            ToolUsage(tool=item['tool_name'], count=item['usage_count'])
+            for item in json.loads(row['tool_usage'])
         ]
-        
+
         return AnalyticsResponse(
-            total_queries=total_queries or 0,
-            avg_tools_per_query=round(avg_tools_per_query or 0, 2),
+            total_queries=row['total_queries'] or 0,
+            avg_tools_per_query=round(row['avg_tools_per_query'] or 0, 2),
             tool_usage=tool_usage
         )
-            
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        await conn.close()
     
@@ -24,8 +24,15 @@ class Settings(BaseSettings):
     pinecone_cloud: str = "aws"
     pinecone_region: str = "us-east-1"
     pinecone_metric: str = "cosine"
+    pinecone_namespace: str = ""
+    pinecone_hosted_model: str = "multilingual-e5-large"
     
     # Embedding Configuration
+    # "model2vec" uses a distilled static model (much cheaper on CPU);
+    # "huggingface" keeps the full sentence-transformers runtime;
+    # "pinecone" embeds server-side on an inference-integrated index
+    embedding_backend: str = "model2vec"
+    model2vec_model_name: str = "minishlab/potion-base-8M"
     embedding_model_name: str = "sentence-transformers/all-MiniLM-L6-v2"
     embedding_device : str = "cpu"
     
@@ -36,6 +43,9 @@ class Settings(BaseSettings):
     # Search Configuration
     similarity_search_k: int = 4
     web_search_max_results: int = 3
+
+    # Tool Execution
+    tool_timeout: float = 15.0  # Seconds before a hung tool call is abandoned
     
     # Database Configuration
     database_url : str = os.getenv("DATABASE_URL", "")
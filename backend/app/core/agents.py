@@ -1,9 +1,14 @@
 """
 Agent tools and node definitions
 """
+import asyncio
+import time
+from collections import defaultdict
+from functools import lru_cache
+
+from langchain_core.messages import ToolMessage
 from langchain_core.tools import tool
 from langchain_community.tools.tavily_search import TavilySearchResults
-from langgraph.prebuilt import ToolNode
 from app.services.vector_store import get_vector_store_service
 from app.config import get_settings
 from app.services.sql_service import get_sql_service
@@ -27,20 +32,24 @@ async def search_knowledge_base(query: str) -> str:
     
     return f"Knowledge Base Results: \n{results}"
 
-@tool
-async def search_web(query:str) -> str:
-    """Search the web for current information, news, or facts not in the knowledge base.
-    Use this for recent events, real-time data, or when knowledge base has no results."""
-    
-    settings=  get_settings()
-    searrch_tool = TavilySearchResults(
+@lru_cache(maxsize=1)
+def _web_search_tool():
+    """Build the Tavily search tool once so its HTTP client is reused"""
+    settings = get_settings()
+    return TavilySearchResults(
         max_results=settings.web_search_max_results,
         search_depth= "advanced",
         include_answer= True,
         include_raw_content=True
-    )    
-    
-    results = await searrch_tool.ainvoke({"query": query})
+    )
+
+
+@tool
+async def search_web(query:str) -> str:
+    """Search the web for current information, news, or facts not in the knowledge base.
+    Use this for recent events, real-time data, or when knowledge base has no results."""
+
+    results = await _web_search_tool().ainvoke({"query": query})
     
     formatted = []
     for r in results:
@@ -124,6 +133,89 @@ def get_tools():
     """Get list of availabe tools"""
     return [search_knowledge_base, search_web, sql_query_generator]
 
+
+@lru_cache(maxsize=1)
+def _tools_by_name():
+    """Tool lookup table for dispatching tool calls"""
+    return {t.name: t for t in get_tools()}
+
+
+# Circuit breaker: open a tool after this many consecutive failures,
+# short-circuiting further calls until the cooldown elapses
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_RESET_SECONDS = 30.0
+
+_breaker_failures = defaultdict(int)
+_breaker_opened_at = {}
+
+
+def _breaker_is_open(tool_name: str) -> bool:
+    """Check whether calls to this tool are currently short-circuited"""
+    opened_at = _breaker_opened_at.get(tool_name)
+    if opened_at is None:
+        return False
+
+    if time.monotonic() - opened_at >= BREAKER_RESET_SECONDS:
+        # Cooldown elapsed; allow calls again
+        del _breaker_opened_at[tool_name]
+        _breaker_failures[tool_name] = 0
+        return False
+
+    return True
+
+
+def _breaker_record(tool_name: str, success: bool):
+    """Track call outcomes, opening the breaker on repeated failures"""
+    if success:
+        _breaker_failures[tool_name] = 0
+        _breaker_opened_at.pop(tool_name, None)
+    else:
+        _breaker_failures[tool_name] += 1
+        if _breaker_failures[tool_name] >= BREAKER_FAILURE_THRESHOLD:
+            _breaker_opened_at[tool_name] = time.monotonic()
+
+
+async def _dispatch_tool(tool_call):
+    """Run a single tool call and wrap its output as a ToolMessage"""
+    tool_name = tool_call["name"]
+
+    if _breaker_is_open(tool_name):
+        content = f"Tool {tool_name} is temporarily unavailable after repeated failures."
+    else:
+        try:
+            output = await asyncio.wait_for(
+                _tools_by_name()[tool_name].ainvoke(tool_call["args"]),
+                timeout=get_settings().tool_timeout
+            )
+            _breaker_record(tool_name, success=True)
+            content = str(output)
+        except asyncio.TimeoutError:
+            _breaker_record(tool_name, success=False)
+            content = f"Tool {tool_name} timed out."
+        except Exception as e:
+            _breaker_record(tool_name, success=False)
+            content = f"Tool {tool_name} failed: {e}"
+
+    return ToolMessage(
+        content=content,
+        name=tool_name,
+        tool_call_id=tool_call["id"]
+    )
+
+
+async def tools_node(state):
+    """Execute the tool calls from the last message concurrently"""
+    tool_calls = state["messages"][-1].tool_calls
+    results = await asyncio.gather(
+        *[_dispatch_tool(call) for call in tool_calls]
+    )
+    return {
+        "messages": list(results),
+        "tool_used": {call["name"] for call in tool_calls},
+        "tool_calls_made": state.get("tool_calls_made", 0) + len(tool_calls)
+    }
+
+
 def get_tool_node():
     """Get tool node for graph"""
-    return ToolNode(get_tools())
\ No newline at end of file
+    return tools_node
\ No newline at end of file
@@ -1,6 +1,9 @@
 """
 System prompts and message templates
 """
+from functools import lru_cache
+
+from langchain_core.messages import SystemMessage
 
 SYSTEM_PROMPT = """You are intelligent assistant with access to:
 1. Internal knowledge base (documents uploaded by users)
@@ -15,9 +18,9 @@ IMPORTANT:
 - Provide comprehensive answers with source citations"""
 
 
+@lru_cache(maxsize=1)
 def get_system_message():
-    """Get the system message for the agent"""
-    from langchain_core.messages import SystemMessage
+    """Get the cached system message for the agent"""
     return SystemMessage(SYSTEM_PROMPT)
 
  
@@ -1,12 +1,42 @@
 """
-Agent State Defination 
+Agent State Defination
 """
-from typing import Annotated, Sequence, TypedDict, List
-from langchain_core.messages import BaseMessage
+from __future__ import annotations
+
+from typing import Annotated, Sequence, Set, TypedDict, List
+from langchain_core.messages import BaseMessage, SystemMessage, ToolMessage
 from langgraph.graph.message import add_messages
 
+# Sliding window: the graph only ever needs the recent turns
+MAX_MESSAGE_WINDOW = 20
+
+
+def bounded_add_messages(left, right):
+    """add_messages capped to the last MAX_MESSAGE_WINDOW entries,
+    always preserving a leading system message and never starting the
+    window on an orphaned tool response"""
+    merged = add_messages(left, right)
+    if len(merged) <= MAX_MESSAGE_WINDOW:
+        return merged
+
+    head = merged[:1] if isinstance(merged[0], SystemMessage) else []
+    tail = list(merged[-(MAX_MESSAGE_WINDOW - len(head)):])
+
+    # A cut between an AIMessage's tool_calls and its ToolMessages
+    # leaves tool responses without their request, a sequence
+    # OpenAI-compatible backends reject with a 400
+    while tail and isinstance(tail[0], ToolMessage):
+        del tail[0]
+    return head + tail
+
+
+def merge_tool_names(left: Set[str], right: Set[str]) -> Set[str]:
+    """Accumulate the names of tools used across graph steps"""
+    return set(left or ()) | set(right or ())
+
 
-class AgentState(TypedDict):
-    messages: Annotated[Sequence[BaseMessage], add_messages]
+class AgentState(TypedDict, total=False):
+    messages: Annotated[Sequence[BaseMessage], bounded_add_messages]
     tool_calls_made: int
-    source_used : List[str]
\ No newline at end of file
+    sources_used : List[str]
+    tool_used: Annotated[Set[str], merge_tool_names]
@@ -1,21 +1,51 @@
 """
 Database connection management
 """
+import asyncio
+
 import asyncpg
 from app.config import get_settings
 
 
-async def get_db_connection():
-    """Create and return database connection"""
-    setting = get_settings()
-    return await asyncpg.connect(setting.database_url)
+# Global pool instance
+_db_pool = None
+
+
+async def init_db_pool():
+    """Create the shared connection pool (called on startup)"""
+    global _db_pool
+    if _db_pool is None:
+        setting = get_settings()
+        _db_pool = await asyncpg.create_pool(
+            setting.database_url,
+            min_size=2,
+            max_size=20,
+            statement_cache_size=1024
+        )
+    return _db_pool
+
+
+async def get_db_pool():
+    """Get or create the shared connection pool"""
+    if _db_pool is None:
+        return await init_db_pool()
+    return _db_pool
+
+
+async def close_db_pool():
+    """Close the shared connection pool (called on shutdown)"""
+    global _db_pool
+    if _db_pool is not None:
+        await _db_pool.close()
+        _db_pool = None
+
 
 async def create_tables():
     """Create necessary database tables"""
-    conn = await get_db_connection()
-    
-    try:
-        # Create agent_queries table 
+    pool = await get_db_pool()
+
+    async with pool.acquire() as conn:
+        # Create agent_queries table
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS agent_queries (
                 id SERIAL PRIMARY KEY,
@@ -26,7 +56,7 @@ async def create_tables():
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
-        
+
         # Create agent_tool_usage table
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS agent_tool_usage (
@@ -34,9 +64,111 @@ async def create_tables():
                 query_id INTEGER REFERENCES agent_queries(id),
                 tool_name VARCHAR(100) NOT NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )              
+            )
        """)
-        
+
+        # Index + rollup so analytics doesn't scan full history per request
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS ix_tool_usage_name
+            ON agent_tool_usage(tool_name)
+        """)
+
+        await conn.execute("""
+            CREATE MATERIALIZED VIEW IF NOT EXISTS agent_tool_usage_rollup AS
+                SELECT tool_name, COUNT(*) AS usage_count
+                FROM agent_tool_usage
+                GROUP BY tool_name
+        """)
+
         print("Database tables created successfully")
-    finally:
-        await conn.close()
\ No newline at end of file
+
+
+# Buffered analytics writes, flushed in batches by a background task
+_analytics_queue = None
+
+FLUSH_INTERVAL_SECONDS = 0.1
+FLUSH_MAX_ROWS = 500
+QUEUE_MAX_ROWS = 10_000
+
+
+def get_analytics_queue():
+    """Get or create the analytics write queue"""
+    global _analytics_queue
+    if _analytics_queue is None:
+        _analytics_queue = asyncio.Queue(maxsize=QUEUE_MAX_ROWS)
+    return _analytics_queue
+
+
+def record_query(session_id: str, query: str, answer: str, tools_used: list):
+    """Buffer one query record for asynchronous persistence.
+
+    Analytics are best-effort: if the queue fills up (e.g. the writer
+    task never started because the database was unavailable) the record
+    is dropped instead of growing the queue without bound.
+    """
+    try:
+        get_analytics_queue().put_nowait((session_id, query, answer, tools_used))
+    except asyncio.QueueFull:
+        pass
+
+
+async def _flush_analytics(batch):
+    """Write a batch of query records in two bulk statements"""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """INSERT INTO agent_queries (session_id, query, answer, tools_used)
+               SELECT * FROM unnest($1::varchar[], $2::text[], $3::text[], $4::int[])
+               RETURNING id""",
+            [item[0] for item in batch],
+            [item[1] for item in batch],
+            [item[2] for item in batch],
+            [len(item[3]) for item in batch]
+        )
+
+        records = [
+            (row['id'], tool_name)
+            for row, item in zip(rows, batch)
+            for tool_name in item[3]
+        ]
+        if records:
+            await conn.copy_records_to_table(
+                "agent_tool_usage",
+                records=records,
+                columns=["query_id", "tool_name"]
+            )
+
+
+async def analytics_writer_loop():
+    """Drain the analytics queue and flush batched records"""
+    queue = get_analytics_queue()
+    while True:
+        batch = [await queue.get()]
+        await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
+        while len(batch) < FLUSH_MAX_ROWS:
+            try:
+                batch.append(queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+        try:
+            await _flush_analytics(batch)
+        except Exception as e:
+            print(f"Could not flush analytics batch: {e}")
+
+
+async def refresh_tool_usage_rollup():
+    """Refresh the tool-usage rollup materialized view"""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        await conn.execute("REFRESH MATERIALIZED VIEW agent_tool_usage_rollup")
+
+
+async def rollup_refresh_loop(interval_seconds: int = 60):
+    """Periodically refresh the rollup in the background"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await refresh_tool_usage_rollup()
+        except Exception as e:
+            print(f"Could not refresh tool usage rollup: {e}")
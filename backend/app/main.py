@@ -1,15 +1,30 @@
 """
 FastAPI application entry point
 """
+import asyncio
+
+import uvloop
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 
 from app.config import get_settings
 from app.api.v1.routes import router as v1_router
-from app.db.session import create_tables
+from app.db.session import (
+    create_tables,
+    init_db_pool,
+    close_db_pool,
+    rollup_refresh_loop,
+    analytics_writer_loop
+)
 from app.utils.logging import setup_logging, get_logger
 
+# All hot endpoints are async I/O bound; uvloop speeds up the socket layer
+# regardless of how the server process is launched
+uvloop.install()
+
 
 @asynccontextmanager
 async def lifespan(app:FastAPI):
@@ -18,17 +33,24 @@ async def lifespan(app:FastAPI):
     logger = get_logger(__name__)
     logger.info("Starting application...")
     
-    # Initialize database tables
+    # Initialize connection pool and database tables
+    background_tasks = []
     try:
+        await init_db_pool()
         await create_tables()
+        background_tasks.append(asyncio.create_task(rollup_refresh_loop()))
+        background_tasks.append(asyncio.create_task(analytics_writer_loop()))
         logger.info("Database tables initialized")
     except Exception as e:
         logger.warning(f"Could not create database tables: {e}")
-        
+
     yield
-    
+
     # Shutdown
     logger.info("Shutting down application...")
+    for task in background_tasks:
+        task.cancel()
+    await close_db_pool()
     
 
 def create_app()-> FastAPI:
@@ -43,7 +65,8 @@ def create_app()-> FastAPI:
     app = FastAPI(
         title=  settings.app_title,
         version= settings.app_version,
-        lifespan= lifespan
+        lifespan= lifespan,
+        default_response_class= ORJSONResponse
     )
     
     
@@ -56,6 +79,10 @@ def create_app()-> FastAPI:
         allow_headers=["*"],
     )
     
+    # Compress sizeable responses (analytics, source-heavy answers) for
+    # clients that advertise gzip support; tiny payloads are left alone
+    app.add_middleware(GZipMiddleware, minimum_size=1024)
+
     # Include routers
     app.include_router(v1_router, prefix="/api/v1", tags=["v1"])
         
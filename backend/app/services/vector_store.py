@@ -1,30 +1,94 @@
 """
 Vector store service for document embeddings and search
 """
+import asyncio
+import uuid
+
+import numpy as np
+from cachetools import LRUCache
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_pinecone import PineconeVectorStore
 from langchain_huggingface import HuggingFaceEmbeddings
 from pinecone import Pinecone, ServerlessSpec
 from app.config import get_settings
 
+# Semantic search cache: queries whose embeddings are this similar share results
+SEARCH_CACHE_SIZE = 1024
+SEARCH_CACHE_THRESHOLD = 0.95
+
+# Documents embedded and upserted per batch during ingestion
+EMBED_BATCH_SIZE = 64
+
+
+class Model2VecEmbeddings(Embeddings):
+    """LangChain Embeddings wrapper around a distilled model2vec StaticModel"""
+
+    def __init__(self, model_name: str):
+        from model2vec import StaticModel
+        self.model = StaticModel.from_pretrained(model_name)
+
+    def _normalize(self, vectors):
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def embed_documents(self, texts):
+        return self._normalize(self.model.encode(list(texts))).tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
 
 class VectorStoreService:
     """Service for managing vector store operations"""
-    
+
     def __init__(self):
         self.setting = get_settings()
-        self.embeddings = self._initialize_embedding()
         self.pc = Pinecone(api_key=self.setting.pinecone_api_key)
-        self._ensure_index_exists()
-        self.vectorstore = self._initialize_vectorstore()
+        self.hosted = self.setting.embedding_backend == "pinecone"
+
+        if self.hosted:
+            # Pinecone embeds server-side; no local model at all
+            self.embeddings = None
+            self._ensure_hosted_index_exists()
+            self.vectorstore = self.pc.Index(self.setting.pinecone_index_name)
+        else:
+            self.embeddings = self._initialize_embedding()
+            self._ensure_index_exists()
+            self.vectorstore = self._initialize_vectorstore()
+
+        self._search_cache = LRUCache(maxsize=SEARCH_CACHE_SIZE)
         
     def _initialize_embedding(self):
-        """Initialize HugingFace Embedding"""
+        """Initialize the configured embedding backend"""
+        if self.setting.embedding_backend == "model2vec":
+            return Model2VecEmbeddings(self.setting.model2vec_model_name)
+
+        # One torch thread per forward pass; concurrency comes from the
+        # executor threads, not intra-op parallelism
+        import torch
+        torch.set_num_threads(1)
+
         return HuggingFaceEmbeddings(
             model_name = self.setting.embedding_model_name,
             model_kwargs = {'device': self.setting.embedding_device},
-            encode_kwargs = {'normalize_embedding': True}
+            encode_kwargs = {'batch_size': EMBED_BATCH_SIZE, 'normalize_embeddings': True}
         )
     
+    def _ensure_hosted_index_exists(self):
+        """Create an inference-integrated Pinecone index if it doesn't exist"""
+        if self.setting.pinecone_index_name not in self.pc.list_indexes().names():
+            self.pc.create_index_for_model(
+                name= self.setting.pinecone_index_name,
+                cloud= self.setting.pinecone_cloud,
+                region= self.setting.pinecone_region,
+                embed= {
+                    "model": self.setting.pinecone_hosted_model,
+                    "field_map": {"text": "page_content"}
+                }
+            )
+
     def _ensure_index_exists(self):
         """Create Pinecone index if it doesn't exists"""
         if self.setting.pinecone_index_name not in self.pc.list_indexes().names():
@@ -51,14 +115,125 @@ class VectorStoreService:
     
         
     async def add_documents(self, documents):
-        """Add documents to vector store"""
-        return self.vectorstore.add_documents(documents)    
-    
-    
+        """Add documents to vector store in embedding-sized batches"""
+        if self.hosted:
+            return await self._add_documents_hosted(documents)
+
+        ids = []
+        for start in range(0, len(documents), EMBED_BATCH_SIZE):
+            batch = documents[start:start + EMBED_BATCH_SIZE]
+            texts = [doc.page_content for doc in batch]
+            metadatas = [doc.metadata for doc in batch]
+
+            # Embed the whole batch in one forward pass and upsert it in one
+            # request; to_thread keeps the blocking work off the event loop
+            batch_ids = await asyncio.to_thread(
+                self.vectorstore.add_texts,
+                texts,
+                metadatas=metadatas,
+                batch_size=EMBED_BATCH_SIZE,
+                embedding_chunk_size=EMBED_BATCH_SIZE,
+            )
+            ids.extend(batch_ids)
+        return ids
+
+    async def _add_documents_hosted(self, documents):
+        """Upsert raw text records; Pinecone embeds them server-side"""
+        ids = []
+        for start in range(0, len(documents), EMBED_BATCH_SIZE):
+            batch = documents[start:start + EMBED_BATCH_SIZE]
+            records = []
+            for doc in batch:
+                record_id = str(uuid.uuid4())
+                records.append({
+                    "_id": record_id,
+                    "page_content": doc.page_content,
+                    **{key: str(value) for key, value in doc.metadata.items()}
+                })
+                ids.append(record_id)
+
+            await asyncio.to_thread(
+                self.vectorstore.upsert_records,
+                self.setting.pinecone_namespace,
+                records
+            )
+        return ids
+
+
+    def clear_search_cache(self):
+        """Drop cached search results after the index contents change"""
+        self._search_cache.clear()
+
     async def similarity_search(self, query:str, k:int = None):
-        """Perform similarity search"""
+        """Perform similarity search with a semantic cache"""
         k = k or self.setting.similarity_search_k
-        return await self.vectorstore.asimilarity_search(query , k=k)
+
+        if self.hosted:
+            return await self._similarity_search_hosted(query, k)
+
+        # Embedding is synchronous CPU work; run it off the event loop so
+        # other requests keep being served during the forward pass
+        query_vector = np.asarray(
+            await asyncio.to_thread(self.embeddings.embed_query, query)
+        )
+
+        # Near-duplicate queries reuse cached results instead of hitting Pinecone
+        cached_docs = self._cached_search(query_vector, k)
+        if cached_docs is not None:
+            return cached_docs
+
+        docs = await self.vectorstore.asimilarity_search_by_vector(
+            query_vector.tolist(), k=k
+        )
+        self._search_cache[(query, k)] = (query_vector, docs)
+        return docs
+
+    async def _similarity_search_hosted(self, query: str, k: int):
+        """Search with server-side query embedding; cached by exact query"""
+        cached_docs = self._search_cache.get((query, k))
+        if cached_docs is not None:
+            return cached_docs
+
+        result = await asyncio.to_thread(
+            self.vectorstore.search_records,
+            namespace=self.setting.pinecone_namespace,
+            query={"inputs": {"text": query}, "top_k": k}
+        )
+
+        docs = [
+            Document(
+                page_content=hit["fields"].get("page_content", ""),
+                metadata={
+                    key: value for key, value in hit["fields"].items()
+                    if key != "page_content"
+                }
+            )
+            for hit in result["result"]["hits"]
+        ]
+        self._search_cache[(query, k)] = docs
+        return docs
+
+    def _cached_search(self, query_vector, k):
+        """Return cached docs if a stored query embedding is close enough"""
+        entries = [
+            (cached_vector, docs)
+            for (_, cached_k), (cached_vector, docs) in self._search_cache.items()
+            if cached_k == k
+        ]
+        if not entries:
+            return None
+
+        # One matrix-vector product over all cached embeddings instead of a
+        # Python loop of dot products
+        matrix = np.stack([vector for vector, _ in entries])
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query_vector) or 1.0)
+        norms[norms == 0] = 1.0
+        scores = (matrix @ query_vector) / norms
+
+        best = int(np.argmax(scores))
+        if scores[best] > SEARCH_CACHE_THRESHOLD:
+            return entries[best][1]
+        return None
     
     
 # Global instance
@@ -1,155 +1,198 @@
 """
 API endpoint tests
 """
+import json
+
 import pytest
-from httpx import AsyncClient
+from collections import namedtuple
 from unittest.mock import AsyncMock, patch, MagicMock
-from app.main import app
+
+# Immutable message stand-in; the endpoint only reads .content / .tool_calls
+_Msg = namedtuple("_Msg", ["content", "tool_calls"], defaults=([],))
+
+# Shared agent-graph results, built once per module instead of per test
+_BASE_RESULT = {
+    "messages": [_Msg("Test query"), _Msg("Test answer")]
+}
+_TOOLS_RESULT = {
+    "messages": [
+        _Msg("Test query"),
+        _Msg("Based on the search results...",
+             [{"name": "search_knowledge_base"}, {"name": "search_web"}]),
+        _Msg("Final answer")
+    ],
+    "tool_used": {"search_knowledge_base", "search_web"}
+}
+_SQL_RESULT = {
+    "messages": [
+        _Msg("Show me users"),
+        _Msg("Query results...", [{"name": "sql_query_generator"}]),
+        _Msg("Here are the users")
+    ],
+    "tool_used": {"sql_query_generator"}
+}
+_DEFAULT_SESSION_RESULT = {
+    "messages": [_Msg("Test"), _Msg("Answer")]
+}
 
 
 @pytest.mark.asyncio
-async def test_root_endpoint():
+async def test_root_endpoint(api_client):
     """Test root endpoint returns app info"""
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.get("/")
-        
-        assert response.status_code == 200
-        data = response.json()
-        assert "message" in data
-        assert "version" in data
-        assert "status" in data
-        assert data["status"] == "running"
+    response = await api_client.get("/")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert "message" in data
+    assert "version" in data
+    assert "status" in data
+    assert data["status"] == "running"
 
 
 @pytest.mark.asyncio
-async def test_health_endpoint():
+async def test_health_endpoint(api_client):
     """Test health check endpoint"""
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.get("/health")
-        
-        assert response.status_code == 200
-        data = response.json()
-        assert data["status"] == "healthy"
+    response = await api_client.get("/health")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "healthy"
 
 
 @pytest.mark.asyncio
 @patch('app.api.v1.routes.get_agent_graph')
-async def test_query_agent_success(mock_get_graph):
+async def test_query_agent_success(mock_get_graph, api_client):
     """Test successful agent query"""
     # Mock agent graph response
     mock_graph = AsyncMock()
-    mock_result = {
-        "messages": [
-            MagicMock(content="Test query"),
-            MagicMock(content="Test answer", tool_calls=[])
-        ]
-    }
-    mock_graph.ainvoke.return_value = mock_result
+    mock_graph.ainvoke.return_value = _BASE_RESULT
     mock_get_graph.return_value = mock_graph
-    
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.post(
-            "/api/v1/agent/query",
-            json={"query": "Test question", "session_id": "test123"}
-        )
-        
-        assert response.status_code == 200
-        data = response.json()
-        assert "query" in data
-        assert "answer" in data
-        assert "tool_used" in data
-        assert "sources" in data
-        assert "reasoning_steps" in data
-        assert data["query"] == "Test question"
-        assert data["answer"] == "Test answer"
+
+    response = await api_client.post(
+        "/api/v1/agent/query",
+        json={"query": "Test question", "session_id": "test123"}
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert "query" in data
+    assert "answer" in data
+    assert "tool_used" in data
+    assert "sources" in data
+    assert "reasoning_steps" in data
+    assert data["query"] == "Test question"
+    assert data["answer"] == "Test answer"
 
 
 @pytest.mark.asyncio
 @patch('app.api.v1.routes.get_agent_graph')
-async def test_query_agent_with_tools(mock_get_graph):
+async def test_query_agent_with_tools(mock_get_graph, api_client):
     """Test agent query that uses tools"""
     # Mock agent graph with tool calls
     mock_graph = AsyncMock()
-    
-    # Create mock message with tool calls
-    mock_message_with_tools = MagicMock()
-    mock_message_with_tools.tool_calls = [
-        {"name": "search_knowledge_base"},
-        {"name": "search_web"}
-    ]
-    mock_message_with_tools.content = "Based on the search results..."
-    
-    mock_result = {
-        "messages": [
-            MagicMock(content="Test query"),
-            mock_message_with_tools,
-            MagicMock(content="Final answer", tool_calls=[])
-        ]
-    }
-    mock_graph.ainvoke.return_value = mock_result
+    mock_graph.ainvoke.return_value = _TOOLS_RESULT
     mock_get_graph.return_value = mock_graph
-    
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.post(
-            "/api/v1/agent/query",
-            json={"query": "What is in my documents?"}
-        )
-        
-        assert response.status_code == 200
-        data = response.json()
-        assert "search_knowledge_base" in data["tool_used"]
-        assert "search_web" in data["tool_used"]
+
+    response = await api_client.post(
+        "/api/v1/agent/query",
+        json={"query": "What is in my documents?"}
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert "search_knowledge_base" in data["tool_used"]
+    assert "search_web" in data["tool_used"]
 
 
 @pytest.mark.asyncio
 @patch('app.api.v1.routes.get_agent_graph')
-async def test_query_agent_sql_tool(mock_get_graph):
+async def test_query_agent_sql_tool(mock_get_graph, api_client):
     """Test agent query using SQL tool"""
     mock_graph = AsyncMock()
-    
-    mock_message_with_sql = MagicMock()
-    mock_message_with_sql.tool_calls = [
-        {"name": "sql_query_generator"}
+    mock_graph.ainvoke.return_value = _SQL_RESULT
+    mock_get_graph.return_value = mock_graph
+
+    response = await api_client.post(
+        "/api/v1/agent/query",
+        json={"query": "Show me all users in the database"}
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert "sql_query_generator" in data["tool_used"]
+
+
+@pytest.mark.asyncio
+@patch('app.api.v1.routes.get_agent_graph')
+async def test_query_agent_stream(mock_get_graph, api_client):
+    """Test streaming query endpoint emits token and summary events"""
+    async def fake_events(initial_state, version):
+        chunk = MagicMock(spec_set=["content"])
+        chunk.content = "Hello"
+        yield {"event": "on_chat_model_stream", "data": {"chunk": chunk}}
+        yield {"event": "on_tool_start", "name": "search_knowledge_base"}
+        yield {"event": "on_chat_model_end"}
+
+    mock_graph = MagicMock()
+    mock_graph.astream_events = fake_events
+    mock_get_graph.return_value = mock_graph
+
+    response = await api_client.post(
+        "/api/v1/agent/query/stream",
+        json={"query": "Test question"}
+    )
+
+    assert response.status_code == 200
+    events = [
+        json.loads(line[len("data: "):])
+        for line in response.text.split("\n\n")
+        if line.startswith("data: ")
     ]
-    mock_message_with_sql.content = "Query results..."
-    
-    mock_result = {
-        "messages": [
-            MagicMock(content="Show me users"),
-            mock_message_with_sql,
-            MagicMock(content="Here are the users", tool_calls=[])
-        ]
-    }
-    mock_graph.ainvoke.return_value = mock_result
+    assert events[0] == {"type": "token", "content": "Hello"}
+    summary = events[-1]
+    assert summary["type"] == "summary"
+    assert summary["answer"] == "Hello"
+    assert "search_knowledge_base" in summary["tool_used"]
+
+
+@pytest.mark.asyncio
+@patch('app.api.v1.routes.get_agent_graph')
+async def test_delete_session_clears_history(mock_get_graph, api_client):
+    """Test deleting a session drops its stored history"""
+    mock_graph = AsyncMock()
+    mock_graph.ainvoke.return_value = _BASE_RESULT
     mock_get_graph.return_value = mock_graph
-    
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.post(
-            "/api/v1/agent/query",
-            json={"query": "Show me all users in the database"}
-        )
-        
-        assert response.status_code == 200
-        data = response.json()
-        assert "sql_query_generator" in data["tool_used"]
+
+    await api_client.post(
+        "/api/v1/agent/query",
+        json={"query": "First question", "session_id": "hist1"}
+    )
+
+    from app.api.v1.routes import _session_histories
+    assert "hist1" in _session_histories
+
+    response = await api_client.delete("/api/v1/agent/session/hist1")
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "deleted"
+    assert "hist1" not in _session_histories
 
 
 @pytest.mark.asyncio
-async def test_query_agent_missing_query():
+async def test_query_agent_missing_query(api_client):
     """Test query endpoint with missing query field"""
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.post(
-            "/api/v1/agent/query",
-            json={"session_id": "test123"}  # Missing query
-        )
-        
-        assert response.status_code == 422  # Validation error
+    response = await api_client.post(
+        "/api/v1/agent/query",
+        json={"session_id": "test123"}  # Missing query
+    )
+
+    assert response.status_code == 422  # Validation error
 
 
 @pytest.mark.asyncio
 @patch('app.api.v1.routes.get_ingestion_service')
 @patch('app.api.v1.routes.get_vector_store_service')
-async def test_upload_document_success(mock_vector_service, mock_ingestion_service):
+async def test_upload_document_success(mock_vector_service, mock_ingestion_service, api_client, pdf_bytes):
     """Test successful document upload"""
     # Mock services
     mock_ingestion = AsyncMock()
@@ -160,127 +203,153 @@ async def test_upload_document_success(mock_vector_service, mock_ingestion_servi
     }
     mock_ingestion.cleanup_temp_file = MagicMock()
     mock_ingestion_service.return_value = mock_ingestion
-    
+
     mock_vector = AsyncMock()
     mock_vector.add_documents = AsyncMock()
+    mock_vector.clear_search_cache = MagicMock()
     mock_vector_service.return_value = mock_vector
-    
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        # Create a fake PDF file
-        files = {"file": ("test.pdf", b"fake pdf content", "application/pdf")}
-        response = await client.post("/api/v1/documents/upload", files=files)
-        
-        assert response.status_code == 200
-        data = response.json()
-        assert "doc_id" in data
-        assert "filename" in data
-        assert "chunks_created" in data
-        assert "status" in data
-        assert data["status"] == "success"
-        assert data["filename"] == "test.pdf"
+
+    files = {"file": ("test.pdf", pdf_bytes, "application/pdf")}
+    response = await api_client.post("/api/v1/documents/upload", files=files)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert "doc_id" in data
+    assert "filename" in data
+    assert "chunks_created" in data
+    assert "status" in data
+    assert data["status"] == "success"
+    assert data["filename"] == "test.pdf"
+
+
+@pytest.mark.asyncio
+@patch('app.api.v1.routes.get_ingestion_service')
+@patch('app.api.v1.routes.get_vector_store_service')
+async def test_upload_documents_batch(mock_vector_service, mock_ingestion_service, api_client, pdf_bytes):
+    """Test batch upload reports per-file success and failure"""
+    mock_ingestion = AsyncMock()
+    mock_ingestion.process_pdf.return_value = {
+        "doc_id": "test-doc-123",
+        "chunks": [MagicMock()],
+        "num_chunks": 5
+    }
+    mock_ingestion_service.return_value = mock_ingestion
+
+    mock_vector = AsyncMock()
+    mock_vector.add_documents = AsyncMock()
+    mock_vector.clear_search_cache = MagicMock()
+    mock_vector_service.return_value = mock_vector
+
+    files = [
+        ("files", ("a.pdf", pdf_bytes, "application/pdf")),
+        ("files", ("notes.txt", b"plain text", "text/plain"))
+    ]
+    response = await api_client.post("/api/v1/documents/upload_batch", files=files)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == 2
+    assert data[0]["status"] == "success"
+    assert data[0]["filename"] == "a.pdf"
+    assert data[1]["status"].startswith("error")
 
 
 @pytest.mark.asyncio
-async def test_upload_document_missing_file():
+async def test_upload_document_missing_file(api_client):
     """Test upload endpoint without file"""
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.post("/api/v1/documents/upload")
-        
-        assert response.status_code == 422  # Validation error
+    response = await api_client.post("/api/v1/documents/upload")
+
+    assert response.status_code == 422  # Validation error
 
 
 @pytest.mark.asyncio
-@patch('app.api.v1.routes.get_db_connection')
-async def test_analytics_endpoint(mock_get_connection):
+@patch('app.api.v1.routes.get_db_pool')
+async def test_analytics_endpoint(mock_get_pool, api_client):
     """Test analytics endpoint"""
-    # Mock database connection and queries
+    # Mock pooled connection and the combined analytics row
     mock_conn = AsyncMock()
-    mock_conn.fetchval.side_effect = [100, 1.5]  # total_queries, avg_tools
-    mock_conn.fetch.return_value = [
-        {"tool_name": "search_knowledge_base", "usage_count": 60},
-        {"tool_name": "search_web", "usage_count": 30},
-        {"tool_name": "sql_query_generator", "usage_count": 10}
-    ]
-    mock_conn.close = AsyncMock()
-    mock_get_connection.return_value = mock_conn
-    
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.get("/api/v1/agent/analytics")
-        
-        assert response.status_code == 200
-        data = response.json()
-        assert "total_queries" in data
-        assert "avg_tools_per_query" in data
-        assert "tool_usage" in data
-        assert data["total_queries"] == 100
-        assert data["avg_tools_per_query"] == 1.5
-        assert len(data["tool_usage"]) == 3
+    mock_conn.fetchrow.return_value = {
+        "total_queries": 100,
+        "avg_tools_per_query": 1.5,
+        "tool_usage": json.dumps([
+            {"tool_name": "search_knowledge_base", "usage_count": 60},
+            {"tool_name": "search_web", "usage_count": 30},
+            {"tool_name": "sql_query_generator", "usage_count": 10}
+        ])
+    }
+    mock_pool = MagicMock()
+    mock_pool.acquire.return_value.__aenter__ = AsyncMock(return_value=mock_conn)
+    mock_pool.acquire.return_value.__aexit__ = AsyncMock(return_value=False)
+    mock_get_pool.return_value = mock_pool
+
+    response = await api_client.get("/api/v1/agent/analytics")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert "total_queries" in data
+    assert "avg_tools_per_query" in data
+    assert "tool_usage" in data
+    assert data["total_queries"] == 100
+    assert data["avg_tools_per_query"] == 1.5
+    assert len(data["tool_usage"]) == 3
 
 
 @pytest.mark.asyncio
-@patch('app.api.v1.routes.get_db_connection')
-async def test_analytics_database_error(mock_get_connection):
+@patch('app.api.v1.routes.get_db_pool')
+async def test_analytics_database_error(mock_get_pool, api_client):
     """Test analytics endpoint handles database errors"""
     # Mock database error
     mock_conn = AsyncMock()
-    mock_conn.fetchval.side_effect = Exception("Database connection failed")
-    mock_conn.close = AsyncMock()
-    mock_get_connection.return_value = mock_conn
-    
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.get("/api/v1/agent/analytics")
-        
-        assert response.status_code == 500
+    mock_conn.fetchrow.side_effect = Exception("Database connection failed")
+    mock_pool = MagicMock()
+    mock_pool.acquire.return_value.__aenter__ = AsyncMock(return_value=mock_conn)
+    mock_pool.acquire.return_value.__aexit__ = AsyncMock(return_value=False)
+    mock_get_pool.return_value = mock_pool
+
+    response = await api_client.get("/api/v1/agent/analytics")
+
+    assert response.status_code == 500
 
 
 @pytest.mark.asyncio
-async def test_invalid_endpoint():
+async def test_invalid_endpoint(api_client):
     """Test request to non-existent endpoint"""
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.get("/api/v1/nonexistent")
-        
-        assert response.status_code == 404
+    response = await api_client.get("/api/v1/nonexistent")
+
+    assert response.status_code == 404
 
 
 @pytest.mark.asyncio
 @patch('app.api.v1.routes.get_agent_graph')
-async def test_query_agent_error_handling(mock_get_graph):
+async def test_query_agent_error_handling(mock_get_graph, api_client):
     """Test agent query error handling"""
     # Mock agent to raise exception
     mock_graph = AsyncMock()
     mock_graph.ainvoke.side_effect = Exception("Agent processing error")
     mock_get_graph.return_value = mock_graph
-    
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.post(
-            "/api/v1/agent/query",
-            json={"query": "Test question"}
-        )
-        
-        assert response.status_code == 500
-        data = response.json()
-        assert "detail" in data
+
+    response = await api_client.post(
+        "/api/v1/agent/query",
+        json={"query": "Test question"}
+    )
+
+    assert response.status_code == 500
+    data = response.json()
+    assert "detail" in data
 
 
 @pytest.mark.asyncio
-async def test_query_with_default_session():
+async def test_query_with_default_session(api_client):
     """Test query uses default session_id when not provided"""
     with patch('app.api.v1.routes.get_agent_graph') as mock_get_graph:
         mock_graph = AsyncMock()
-        mock_result = {
-            "messages": [
-                MagicMock(content="Test"),
-                MagicMock(content="Answer", tool_calls=[])
-            ]
-        }
-        mock_graph.ainvoke.return_value = mock_result
+        mock_graph.ainvoke.return_value = _DEFAULT_SESSION_RESULT
         mock_get_graph.return_value = mock_graph
-        
-        async with AsyncClient(app=app, base_url="http://test") as client:
-            response = await client.post(
-                "/api/v1/agent/query",
-                json={"query": "Test"}  # No session_id
-            )
-            
-            assert response.status_code == 200
-            # Should use default session_id = "default"
\ No newline at end of file
+
+        response = await api_client.post(
+            "/api/v1/agent/query",
+            json={"query": "Test"}  # No session_id
+        )
+
+        assert response.status_code == 200
+        # Should use default session_id = "default"
@@ -2,8 +2,14 @@
 Streamlit Frontend for Intelligent RAG Agent
 """
 import streamlit as st
-import requests
+import hashlib
+import orjson
+from collections import deque
+import httpx
 import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict
 from datetime import datetime
 
@@ -19,35 +25,140 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+@st.cache_resource(show_spinner=False)
+def get_client() -> httpx.Client:
+    """Pooled HTTP client reused across Streamlit reruns.
+
+    Keep-alive sockets avoid a fresh TCP handshake on every rerun, and
+    concurrent calls multiplex over one socket when the backend
+    negotiates HTTP/2 (plain HTTP/1.1 keep-alive otherwise).
+    """
+    transport = httpx.HTTPTransport(
+        retries=3,
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=100,
+            max_keepalive_connections=40,
+            keepalive_expiry=30
+        )
+    )
+    return httpx.Client(
+        transport=transport,
+        # Explicit so the backend's gzip middleware compresses large
+        # responses (httpx decompresses transparently)
+        headers={"Accept-Encoding": "gzip, deflate"},
+        timeout=httpx.Timeout(connect=2.0, read=120.0, write=30.0, pool=5.0)
+    )
+
+
+_session = get_client()
+
+
+@st.cache_resource(show_spinner=False)
+def get_executor() -> ThreadPoolExecutor:
+    """Background workers for uploads so the UI stays responsive"""
+    return ThreadPoolExecutor(max_workers=4)
+
 # Initialize session state
 if "messages" not in st.session_state:
     st.session_state.messages = []
 if "session_id" not in st.session_state:
-    st.session_state.session_id = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    st.session_state.session_id = uuid.uuid4().hex
 if "uploaded_docs" not in st.session_state:
-    st.session_state.uploaded_docs = []
+    # Bounded so a long-lived session can't grow state without limit
+    st.session_state.uploaded_docs = deque(maxlen=500)
+if "asked_queries" not in st.session_state:
+    st.session_state.asked_queries = set()
+if "source_store" not in st.session_state:
+    st.session_state.source_store = {}
+
+
+def intern_sources(sources: List) -> List[str]:
+    """Deduplicate sources into the session store, returning their ids.
+
+    The same retrieved chunks recur across turns in a long chat;
+    storing each once under a content hash keeps per-message metadata
+    (and session_state pickling) small.
+    """
+    store = st.session_state.source_store
+    ids = []
+    for source in sources:
+        raw = source.encode() if isinstance(source, str) else orjson.dumps(source)
+        source_id = hashlib.blake2b(raw, digest_size=16).hexdigest()
+        store.setdefault(source_id, source)
+        ids.append(source_id)
+    return ids
+
+
+def render_metadata(metadata: Dict):
+    """Render the response-details expander for an assistant message"""
+    with st.expander("📊 Response Details"):
+        tools = metadata.get("tool_used") or []
+        if tools:
+            st.markdown(f"**Tools Used:** {', '.join(tools)}")
+        st.markdown(f"**Reasoning Steps:** {metadata.get('reasoning_steps', 0)}")
+        source_ids = metadata.get("source_ids") or []
+        if source_ids:
+            st.markdown(f"**Sources:** {len(source_ids)}")
 
 
 def reset_chat():
-    """Reset chat history"""
+    """Reset chat history, dropping the server-side session too"""
+    try:
+        _session.delete(
+            f"{API_BASE}/agent/session/{st.session_state.session_id}",
+            timeout=5
+        )
+    except httpx.HTTPError:
+        pass  # Backend history expires from its LRU on its own
     st.session_state.messages = []
-    st.session_state.session_id = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    st.session_state.asked_queries = set()
+    st.session_state.source_store = {}
+    # uuid4 is collision-free even for rapid resets, unlike a
+    # second-resolution strftime string
+    st.session_state.session_id = uuid.uuid4().hex
+    query_agent_cached.clear()
 
 
-def upload_document(file) -> Dict:
-    """Upload document to backend"""
-    try:
-        files = {"file": (file.name, file.getvalue(), file.type)}
-        response = requests.post(
+def _upload_request(files_payload, batch: bool) -> List[Dict]:
+    """Upload POST suitable for a worker thread (no Streamlit calls).
+
+    Returns a list of per-file result dicts; raises on transport errors
+    so the polling code can surface them.
+    """
+    if batch:
+        response = _session.post(
+            f"{API_BASE}/documents/upload_batch",
+            files=files_payload,
+            timeout=300
+        )
+    else:
+        name, payload = files_payload[0]
+        response = _session.post(
             f"{API_BASE}/documents/upload",
-            files=files,
+            files={"file": payload},
             timeout=60
         )
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        st.error(f"Error uploading document: {str(e)}")
-        return None
+    response.raise_for_status()
+    data = orjson.loads(response.content)
+    return data if batch else [data]
+
+
+def _post_json(url: str, payload: Dict, timeout) -> Dict:
+    """POST JSON and decode the response, both through orjson.
+
+    orjson encodes and decodes several times faster than the stdlib
+    json module, which matters for responses carrying many source
+    chunks.
+    """
+    response = _session.post(
+        url,
+        content=orjson.dumps(payload),
+        headers={"Content-Type": "application/json"},
+        timeout=timeout
+    )
+    response.raise_for_status()
+    return orjson.loads(response.content)
 
 
 def query_agent(query: str, session_id: str) -> Dict:
@@ -57,59 +168,186 @@ def query_agent(query: str, session_id: str) -> Dict:
             "query": query,
             "session_id": session_id
         }
-        response = requests.post(
-            f"{API_BASE}/agent/query",
-            json=payload,
-            timeout=120
-        )
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        return _post_json(f"{API_BASE}/agent/query", payload, timeout=120)
+    except httpx.HTTPError as e:
         st.error(f"Error querying agent: {str(e)}")
         return None
 
 
+# Repeat-query cache: re-asking the same question within 5 minutes
+# skips the round-trip entirely. Keyed on the normalized query so
+# whitespace/case variants share an entry. Calls _post_json directly
+# so an HTTP failure raises instead of caching None for the whole TTL
+# (st.cache_data never memoizes exceptions); the chat panel handles
+# the httpx.HTTPError.
+@st.cache_data(ttl=300, max_entries=128, show_spinner=False)
+def query_agent_cached(q_norm: str, sid: str) -> Dict:
+    payload = {"query": q_norm, "session_id": sid}
+    return _post_json(f"{API_BASE}/agent/query", payload, timeout=120)
+
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace and case for cache-key purposes"""
+    return " ".join(query.lower().split())
+
+
+def stream_query_agent(query: str, session_id: str):
+    """Stream the agent's answer token-by-token.
+
+    Yields text chunks for st.write_stream and stashes the trailing
+    summary event (tools used, sources, reasoning steps) in
+    session_state for the caller to pick up.
+    """
+    payload = {
+        "query": query,
+        "session_id": session_id
+    }
+    with _session.stream(
+        "POST",
+        f"{API_BASE}/agent/query/stream",
+        content=orjson.dumps(payload),
+        headers={"Content-Type": "application/json"},
+        timeout=120
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line or not line.startswith("data:"):
+                continue
+            event = orjson.loads(line[len("data:"):])
+            if event.get("type") == "token":
+                yield event.get("content", "")
+            elif event.get("type") == "summary":
+                st.session_state.last_summary = event
+            elif event.get("type") == "error":
+                raise RuntimeError(event.get("detail", "Streaming error"))
+
+
 def get_analytics() -> Dict:
-    """Get analytics from backend"""
+    """Get analytics from backend (no Streamlit calls: runs in workers)"""
     try:
-        response = requests.get(
+        response = _session.get(
             f"{API_BASE}/agent/analytics",
             timeout=10
         )
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        st.warning(f"Could not fetch analytics: {str(e)}")
+        return orjson.loads(response.content)
+    except httpx.HTTPError:
         return None
 
 
-# Sidebar
-with st.sidebar:
+# cache_data is shared across user sessions, which is what we want
+# here: analytics are global, so one fetch per TTL serves everyone.
+@st.cache_data(ttl=30, show_spinner=False)
+def get_analytics_cached() -> Dict:
+    """Analytics snapshot, refreshed at most every 30 seconds"""
+    return get_analytics()
+
+
+@st.cache_resource(show_spinner=False)
+def _health_breaker() -> Dict:
+    """Mutable circuit-breaker state shared across reruns and sessions"""
+    return {"failures": 0, "open_until": 0.0}
+
+
+@st.cache_data(ttl=10, show_spinner=False)
+def backend_status() -> bool:
+    """Probe backend health, at most once per TTL.
+
+    The (connect, read) timeout split makes an offline backend fail in
+    half a second instead of hanging the sidebar for five, and a
+    circuit breaker skips the probe entirely for 30s after three
+    consecutive failures so a dead backend costs nothing per rerun.
+    """
+    breaker = _health_breaker()
+    if time.monotonic() < breaker["open_until"]:
+        return False
+
+    try:
+        response = _session.get(
+            f"{BACKEND_URL}/health",
+            timeout=httpx.Timeout(2.0, connect=0.5)
+        )
+        ok = response.status_code == 200
+    except httpx.HTTPError:
+        ok = False
+
+    if ok:
+        breaker["failures"] = 0
+    else:
+        breaker["failures"] += 1
+        if breaker["failures"] >= 3:
+            breaker["open_until"] = time.monotonic() + 30
+    return ok
+
+
+# Sidebar: a fragment, so sidebar interactions (uploads, analytics
+# refresh) re-run only this block instead of the whole script
+@st.fragment
+def sidebar_panel():
+    # Kick off the two independent backend fetches in parallel; their
+    # results are collected further down, so the sidebar pays
+    # max(analytics, health) latency instead of the sum
+    analytics_future = get_executor().submit(get_analytics_cached)
+    health_future = get_executor().submit(backend_status)
+
     st.title("🤖 Intelligent RAG Agent")
     st.markdown("---")
     
     # Document Upload Section
-    st.subheader("📄 Upload Document")
-    uploaded_file = st.file_uploader(
-        "Choose a PDF file",
+    st.subheader("📄 Upload Documents")
+    uploaded_files = st.file_uploader(
+        "Choose PDF files",
         type=["pdf"],
-        help="Upload a PDF document to add to the knowledge base"
+        accept_multiple_files=True,
+        help="Upload PDF documents to add to the knowledge base"
     )
-    
-    if uploaded_file is not None:
-        if st.button("Upload Document", use_container_width=True):
-            with st.spinner("Uploading and processing document..."):
-                result = upload_document(uploaded_file)
-                if result:
-                    st.success(f"✅ {result['filename']} uploaded successfully!")
-                    st.info(f"📊 Created {result['chunks_created']} chunks")
-                    st.session_state.uploaded_docs.append({
-                        "filename": result['filename'],
-                        "doc_id": result['doc_id'],
-                        "chunks": result['chunks_created'],
-                        "timestamp": datetime.now()
-                    })
-                    st.rerun()
+
+    pending_upload = st.session_state.get("upload_future")
+    if pending_upload is not None:
+        if pending_upload.done():
+            del st.session_state["upload_future"]
+            try:
+                results = pending_upload.result()
+            except (httpx.HTTPError, ValueError) as e:
+                st.error(f"Error uploading documents: {str(e)}")
+                results = []
+            if any(r.get("status") == "success" for r in results):
+                # Cached answers may predate the new documents
+                query_agent_cached.clear()
+            for result in results:
+                if result.get("status") != "success":
+                    st.error(f"❌ {result['filename']}: {result['status']}")
+                    continue
+                st.success(f"✅ {result['filename']} uploaded successfully!")
+                st.info(f"📊 Created {result['chunks_created']} chunks")
+                st.session_state.uploaded_docs.append({
+                    "filename": result['filename'],
+                    "doc_id": result['doc_id'],
+                    "chunks": result['chunks_created'],
+                    "timestamp": time.time()
+                })
+        else:
+            # Ingestion runs in a worker thread; keep the app usable
+            # and poll again shortly
+            st.info("⏳ Uploading and processing in the background...")
+            time.sleep(0.5)
+            st.rerun(scope="fragment")
+    elif uploaded_files:
+        if st.button("Upload Documents", use_container_width=True):
+            # One round-trip for the whole batch; single-file keeps the
+            # simpler endpoint. Passing the file objects (not
+            # getvalue()) lets the client stream the multipart body
+            # instead of duplicating each PDF in memory.
+            for f in uploaded_files:
+                f.seek(0)
+            payload = [
+                ("files", (f.name, f, f.type))
+                for f in uploaded_files
+            ]
+            st.session_state.upload_future = get_executor().submit(
+                _upload_request, payload, len(uploaded_files) > 1
+            )
+            st.rerun(scope="fragment")
     
     st.markdown("---")
     
@@ -124,12 +362,11 @@ with st.sidebar:
     # Analytics Section
     st.subheader("📊 Analytics")
     if st.button("Refresh Analytics", use_container_width=True):
-        analytics = get_analytics()
-        if analytics:
-            st.session_state.analytics = analytics
-    
-    if "analytics" in st.session_state:
-        analytics = st.session_state.analytics
+        get_analytics_cached.clear()
+        analytics_future = get_executor().submit(get_analytics_cached)
+
+    analytics = analytics_future.result()
+    if analytics:
         st.metric("Total Queries", analytics.get("total_queries", 0))
         st.metric("Avg Tools/Query", f"{analytics.get('avg_tools_per_query', 0):.2f}")
         
@@ -140,14 +377,24 @@ with st.sidebar:
     
     st.markdown("---")
     
-    # Uploaded Documents List
+    # Uploaded Documents List, newest first. Only the last few render by
+    # default so a doc-heavy session doesn't rebuild hundreds of
+    # expanders on every rerun.
     if st.session_state.uploaded_docs:
-        st.subheader("📚 Uploaded Documents")
-        for doc in st.session_state.uploaded_docs:
-            with st.expander(f"📄 {doc['filename']}"):
+        docs = list(st.session_state.uploaded_docs)
+        RECENT_DOCS = 10
+        with st.expander(f"📚 Uploaded Documents ({len(docs)})", expanded=True):
+            show_all = (
+                len(docs) > RECENT_DOCS
+                and st.checkbox(f"Show all {len(docs)} documents")
+            )
+            visible = docs if show_all else docs[-RECENT_DOCS:]
+            for doc in reversed(visible):
+                st.markdown(f"**📄 {doc['filename']}**")
                 st.text(f"ID: {doc['doc_id']}")
                 st.text(f"Chunks: {doc['chunks']}")
-                st.text(f"Uploaded: {doc['timestamp'].strftime('%Y-%m-%d %H:%M')}")
+                uploaded_at = datetime.fromtimestamp(doc['timestamp'])
+                st.text(f"Uploaded: {uploaded_at.strftime('%Y-%m-%d %H:%M')}")
     
     st.markdown("---")
     
@@ -158,79 +405,106 @@ with st.sidebar:
     # Backend Status
     st.markdown("---")
     st.subheader("🔌 Backend Status")
-    try:
-        health_response = requests.get(f"{BACKEND_URL}/health", timeout=5)
-        if health_response.status_code == 200:
-            st.success("✅ Backend Connected")
-        else:
-            st.error("❌ Backend Error")
-    except:
+    if health_future.result():
+        st.success("✅ Backend Connected")
+    else:
         st.error("❌ Backend Offline")
 
 
+with st.sidebar:
+    sidebar_panel()
+
+
 # Main Chat Interface
 st.title("💬 Chat with RAG Agent")
 st.markdown("Ask questions and get intelligent answers powered by RAG!")
 
-# Display chat history
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
+
+# Chat history and input as a fragment: typing and streaming re-run
+# this block without replaying the sidebar fetches
+@st.fragment
+def chat_panel():
+    # Display chat history, windowed so a long conversation doesn't pay
+    # O(n) widget construction on every rerun
+    HISTORY_WINDOW = 20
+    window = st.session_state.get("history_window", HISTORY_WINDOW)
+    hidden = max(0, len(st.session_state.messages) - window)
+    if hidden > 0:
+        if st.button(f"⬆️ Show earlier messages ({hidden} hidden)"):
+            st.session_state.history_window = window + HISTORY_WINDOW
+            st.rerun(scope="fragment")
+
+    for message in st.session_state.messages[hidden:]:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
         
-        # Show metadata if available
-        if message["role"] == "assistant" and "metadata" in message:
-            metadata = message["metadata"]
-            with st.expander("📊 Response Details"):
-                if metadata.get("tool_used"):
-                    st.markdown(f"**Tools Used:** {', '.join(metadata['tool_used'])}")
-                if metadata.get("reasoning_steps"):
-                    st.markdown(f"**Reasoning Steps:** {metadata['reasoning_steps']}")
-                if metadata.get("sources"):
-                    st.markdown(f"**Sources:** {len(metadata['sources'])}")
-
-# Chat input
-if prompt := st.chat_input("Ask a question..."):
-    # Add user message to chat
-    st.session_state.messages.append({"role": "user", "content": prompt})
-    with st.chat_message("user"):
-        st.markdown(prompt)
+            # Show metadata if available
+            if message["role"] == "assistant" and "metadata" in message:
+                render_metadata(message["metadata"])
+
+    # Chat input
+    if prompt := st.chat_input("Ask a question..."):
+        # Debounce: a rerun mid-request (or a rapid double submit) must
+        # not issue a duplicate agent call
+        if st.session_state.get("inflight"):
+            st.toast("Still thinking about the previous question...")
+            st.stop()
+        st.session_state.inflight = True
+
+        # Add user message to chat
+        st.session_state.messages.append({"role": "user", "content": prompt})
+        with st.chat_message("user"):
+            st.markdown(prompt)
     
-    # Get agent response
-    with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            response = query_agent(prompt, st.session_state.session_id)
-            
-            if response:
-                answer = response.get("answer", "No answer received")
-                st.markdown(answer)
-                
+        # Get agent response. Repeat questions in this session go through
+        # the cached non-streaming path and return instantly; new ones
+        # stream token-by-token.
+        q_norm = normalize_query(prompt)
+        repeat = q_norm in st.session_state.asked_queries
+        st.session_state.asked_queries.add(q_norm)
+
+        with st.chat_message("assistant"):
+            st.session_state.pop("last_summary", None)
+            try:
+                if repeat:
+                    summary = query_agent_cached(
+                        q_norm, st.session_state.session_id
+                    ) or {}
+                    answer = summary.get("answer", "")
+                    st.markdown(answer)
+                else:
+                    answer = st.write_stream(
+                        stream_query_agent(prompt, st.session_state.session_id)
+                    )
+                    summary = st.session_state.pop("last_summary", {})
+
                 # Store message with metadata
                 metadata = {
-                    "tool_used": response.get("tool_used", []),
-                    "reasoning_steps": response.get("reasoning_steps", 0),
-                    "sources": response.get("sources", [])
+                    "tool_used": summary.get("tool_used", []),
+                    "reasoning_steps": summary.get("reasoning_steps", 0),
+                    "source_ids": intern_sources(summary.get("sources", []))
                 }
-                
+
                 st.session_state.messages.append({
                     "role": "assistant",
                     "content": answer,
                     "metadata": metadata
                 })
-                
+
                 # Show metadata
-                with st.expander("📊 Response Details"):
-                    if metadata["tool_used"]:
-                        st.markdown(f"**Tools Used:** {', '.join(metadata['tool_used'])}")
-                    st.markdown(f"**Reasoning Steps:** {metadata['reasoning_steps']}")
-                    if metadata["sources"]:
-                        st.markdown(f"**Sources:** {len(metadata['sources'])}")
-            else:
+                render_metadata(metadata)
+            except (httpx.HTTPError, RuntimeError) as e:
+                st.error(f"Error querying agent: {str(e)}")
                 error_msg = "Sorry, I encountered an error processing your query. Please try again."
-                st.error(error_msg)
                 st.session_state.messages.append({
                     "role": "assistant",
                     "content": error_msg
                 })
+            finally:
+                st.session_state.inflight = False
+
+
+chat_panel()
 
 # Footer
 st.markdown("---")